@@ -1,11 +1,18 @@
 import json
 import copy
+from functools import partial
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
 import streamlit as st
 
-from engine import Engine, Unit, Skill, simulate_many
+try:
+    import orjson
+except ImportError:     # 無ければ標準の json で読み書きする
+    orjson = None
+
+from engine import Unit, Skill, run_once, simulate_many, simulate_many_vectorized
+from engine_numba import NUMBA_AVAILABLE, simulate_many_numba
 
 # ---------- パス設定 ----------
 DATA_DIR = Path(__file__).parent / "data"
@@ -14,19 +21,41 @@ UNITS_PATH = DATA_DIR / "units.json"
 SKILLS_PATH = DATA_DIR / "skills.json"
 PRESETS_PATH = DATA_DIR / "presets.json"
 
+# tuning の既知キー: (キー, 表示名, 既定値, 最小, 最大, 刻み)
+# 既定値の型で入力欄を決める（bool → チェック / int → 整数 / float → 小数）
+TUNING_SCHEMA = [
+    ("max_turns", "最大ターン数", 8, 1, 30, 1),
+    ("physical_scale", "兵刃ダメージ倍率", 20.0, 0.0, 500.0, 1.0),
+    ("strategy_scale", "計略ダメージ倍率", 22.0, 0.0, 500.0, 1.0),
+    ("heal_scale", "回復倍率", 18.0, 0.0, 500.0, 1.0),
+    ("random_min", "乱数幅（下限）", 0.95, 0.0, 2.0, 0.01),
+    ("random_max", "乱数幅（上限）", 1.05, 0.0, 2.0, 0.01),
+    ("defense_factor_physical", "兵刃の防御係数（統率）", 0.7, 0.0, 5.0, 0.05),
+    ("defense_factor_strategy", "計略の防御係数（知略）", 0.8, 0.0, 5.0, 0.05),
+    ("attack_mix_lea", "攻撃に足す統率の割合", 0.5, 0.0, 5.0, 0.05),
+    ("confusion_skip_action", "混乱中は行動しない", True, None, None, None),
+]
+
 st.set_page_config(page_title="真戦 編成シミュ（改良版）", layout="wide")
 
 
 # ---------- 共通関数 ----------
+def _dump_bytes(obj: Any) -> bytes:
+    if orjson:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+
+
 def load_json(path: Path, default: Any) -> Any:
     if path.exists():
-        return json.loads(path.read_text(encoding="utf-8"))
-    path.write_text(json.dumps(default, ensure_ascii=False, indent=2), encoding="utf-8")
+        raw = path.read_bytes()
+        return orjson.loads(raw) if orjson else json.loads(raw.decode("utf-8"))
+    path.write_bytes(_dump_bytes(default))
     return copy.deepcopy(default)
 
 
 def save_json(path: Path, obj: Any):
-    path.write_text(json.dumps(obj, ensure_ascii=False, indent=2), encoding="utf-8")
+    path.write_bytes(_dump_bytes(obj))
 
 
 def pct(x: float) -> str:
@@ -84,12 +113,10 @@ def make_unit(
     return Unit(
         unit_id=unit_data["unit_id"],
         name=unit_data["name"],
-        stats={
-            "str": float(base.get("str", 0)),
-            "int": float(base.get("int", 0)),
-            "lea": float(base.get("lea", 0)),
-            "spd": float(base.get("spd", 0)),
-        },
+        str_=float(base.get("str", 0)),
+        int_=float(base.get("int", 0)),
+        lea=float(base.get("lea", 0)),
+        spd=float(base.get("spd", 0)),
         max_soldiers=max_soldiers,
         soldiers=soldiers,
         unique_skill=unique_skill,
@@ -98,34 +125,49 @@ def make_unit(
     )
 
 
-# ---------- データ読み込み ----------
-tuning = load_json(TUNING_PATH, {})
-units_list = load_json(UNITS_PATH, [])
-skills_list = load_json(SKILLS_PATH, [])
-presets = load_json(PRESETS_PATH, {})
+def skill_display_label(s: Dict[str, Any]) -> str:
+    """UIに出す名前。display_name > name > skill_id の優先度。"""
+    base = s.get("display_name") or s.get("name") or s.get("skill_id", "")
+    return f"{base} ({s.get('skill_id','')})"
 
-unit_map = build_unit_map(units_list)
-skill_map = build_skill_map(skills_list)
 
-all_unit_ids = list(unit_map.keys())
-all_skill_ids = [s["skill_id"] for s in skills_list if s.get("skill_id")]
+def _data_mtimes() -> tuple:
+    return tuple(
+        p.stat().st_mtime if p.exists() else 0.0
+        for p in (TUNING_PATH, UNITS_PATH, SKILLS_PATH, PRESETS_PATH)
+    )
 
-# learn20 / 覚醒 はいったん「全戦法から自由に選べる」
-learn20_ids = all_skill_ids
-awaken_ids = all_skill_ids
 
+@st.cache_data
+def _load_all(mtimes: tuple):
+    """data/*.json の読み込みと索引づくり。mtimes が変わる（=ファイルが更新される）まで使い回す。"""
+    tuning = load_json(TUNING_PATH, {})
+    units_list = load_json(UNITS_PATH, [])
+    skills_list = load_json(SKILLS_PATH, [])
+    presets = load_json(PRESETS_PATH, {})
+    unit_map = build_unit_map(units_list)
+    skill_map = build_skill_map(skills_list)
+    skill_choices = {
+        s["skill_id"]: skill_display_label(s)
+        for s in skills_list
+        if s.get("skill_id")
+    }
+    # 戦法セレクトの選択肢と、選択ラベル → skill_id の逆引き
+    skill_view = ["(なし)"] + [skill_choices[s["skill_id"]] for s in skills_list if s.get("skill_id")]
+    view_to_id = {label: sid for sid, label in skill_choices.items()}
+    return tuning, units_list, skills_list, presets, unit_map, skill_map, skill_choices, skill_view, view_to_id
 
-def skill_display_label(s: Dict[str, Any]) -> str:
-    """UIに出す名前。display_name > name > skill_id の優先度。"""
-    base = s.get("display_name") or s.get("name") or s.get("skill_id", "")
-    return f"{base} ({s.get('skill_id','')})"
 
+# ---------- データ読み込み ----------
+(tuning, units_list, skills_list, presets, unit_map, skill_map,
+ skill_choices, skill_view, view_to_id) = _load_all(_data_mtimes())
 
-skill_choices = {
-    s["skill_id"]: skill_display_label(s)
-    for s in skills_list
-    if s.get("skill_id")
-}
+all_unit_ids = list(unit_map.keys())
+all_skill_ids = [s["skill_id"] for s in skills_list if s.get("skill_id")]
+
+# learn20 / 覚醒 はいったん「全戦法から自由に選べる」
+learn20_view = skill_view
+awaken_view = skill_view
 
 st.title("真戦 編成シミュ（戦法表示名＋プリセット対応版）")
 st.caption("・戦法の表示名を編集可能 / 自軍Aのプリセット保存・読み込み対応")
@@ -136,17 +178,43 @@ with st.sidebar:
     st.header("シミュ設定")
     n_runs = st.number_input("検証回数 N", min_value=1, max_value=100000, value=500, step=100)
     seed = st.number_input("乱数シード", min_value=0, value=123, step=1)
+    vectorized = st.checkbox("一括計算（NumPy・高速）", value=True)
+    if vectorized and NUMBA_AVAILABLE:
+        st.caption("numba を検出: コンパイル版で計算します")
 
     st.subheader("tuning.json（調整用）")
-    tuning_text = st.text_area(
-        "編集（上級者向け）",
-        value=json.dumps(tuning, ensure_ascii=False, indent=2),
-        height=260,
-    )
+    st.caption("入力値はそのまま実行に反映されます（保存で tuning.json に書き込み）")
+    edited: Dict[str, Any] = {}
+    for k, label, default, lo, hi, step in TUNING_SCHEMA:
+        v = tuning.get(k, default)
+        if isinstance(default, bool):
+            edited[k] = st.checkbox(label, value=bool(v), key=f"tune_{k}")
+            continue
+        v = int(v) if isinstance(default, int) else float(v)
+        if not lo <= v <= hi:
+            # 保存済みの値は丸めずにそのまま使う（入力範囲のほうを広げる）
+            st.warning(f"{label}: 保存値 {v} が通常の範囲（{lo}〜{hi}）の外です")
+            lo, hi = min(lo, v), max(hi, v)
+        edited[k] = type(v)(st.number_input(label, min_value=lo, max_value=hi, value=v, step=step, key=f"tune_{k}"))
+    tuning = {**tuning, **edited}
+
+    # 上の一覧に無いキーだけ JSON で直接いじれるようにしておく
+    known_keys = {k for k, *_ in TUNING_SCHEMA}
+    with st.expander("その他のキー（上級者向け）"):
+        extra_text = st.text_area(
+            "編集（JSON）",
+            value=json.dumps({k: v for k, v in tuning.items() if k not in known_keys}, ensure_ascii=False, indent=2),
+            height=120,
+        )
     if st.button("tuning 保存"):
         try:
-            tuning = json.loads(tuning_text)
+            extra = json.loads(extra_text)
+            if not isinstance(extra, dict):
+                raise ValueError("{ ... } の形で書いてください")
+            tuning = {k: v for k, v in tuning.items() if k in known_keys}
+            tuning.update({k: v for k, v in extra.items() if k not in known_keys})
             save_json(TUNING_PATH, tuning)
+            _load_all.clear()
             st.success("tuning.json を保存しました")
         except Exception as e:
             st.error(f"JSON形式が壊れています: {e}")
@@ -200,23 +268,10 @@ def team_skills(prefix: str, picked):
         unique_name = skill_map.get(unique_id, {}).get("name", unique_id)
         st.caption(f"固有戦法: {unique_name}")
 
-        l20_view = ["(なし)"] + [skill_choices[x] for x in learn20_ids]
-        awk_view = ["(なし)"] + [skill_choices[x] for x in awaken_ids]
-
-        l20_sel = st.selectbox("20レベ戦法", l20_view, index=0, key=f"{prefix}_l20_{i}")
-        awk_sel = st.selectbox("覚醒戦法", awk_view, index=0, key=f"{prefix}_awk_{i}")
-
-        def decode(v: str) -> Optional[str]:
-            if v == "(なし)":
-                return None
-            # "... (SKILL_ID)" から ID 部分だけ抜く
-            m_start = v.rfind("(")
-            m_end = v.rfind(")")
-            if m_start != -1 and m_end != -1 and m_end > m_start:
-                return v[m_start + 1:m_end]
-            return None
+        l20_sel = st.selectbox("20レベ戦法", learn20_view, index=0, key=f"{prefix}_l20_{i}")
+        awk_sel = st.selectbox("覚醒戦法", awaken_view, index=0, key=f"{prefix}_awk_{i}")
 
-        results.append((uid, soldiers, decode(l20_sel), decode(awk_sel)))
+        results.append((uid, soldiers, view_to_id.get(l20_sel), view_to_id.get(awk_sel)))
 
     return results
 
@@ -248,6 +303,7 @@ if st.button("この戦法の表示名を保存"):
             s["display_name"] = new_label
             break
     save_json(SKILLS_PATH, skills_list)
+    _load_all.clear()
     st.success("skills.json に保存しました。再読み込みして反映されます。")
     st.rerun()
 else:
@@ -292,6 +348,7 @@ if all_skill_ids:
                 break
 
         save_json(SKILLS_PATH, skills_list)
+        _load_all.clear()
         st.success("data/skills.json に保存しました")
 
 
@@ -321,6 +378,7 @@ with colP1:
                 ]
             }
             save_json(PRESETS_PATH, presets)
+            _load_all.clear()
             st.success(f"プリセット '{preset_name}' を保存しました")
 
 with colP2:
@@ -361,24 +419,22 @@ st.divider()
 st.header("連戦シミュレーション")
 
 
-def build_once(seed_val: int):
-    eng = Engine(tuning, seed=seed_val)
-
-    def make_team(slots):
-        team = []
-        for uid, soldiers, l20_id, awk_id in slots:
-            ud = unit_map[uid]
-            team.append(make_unit(ud, skill_map, soldiers, l20_id, awk_id))
-        return team
-
-    team_a = make_team(slots_A)
-    team_b = make_team(slots_B)
-    return eng.run_battle(team_a, team_b)
+def make_team(slots):
+    team = []
+    for uid, soldiers, l20_id, awk_id in slots:
+        ud = unit_map[uid]
+        team.append(make_unit(ud, skill_map, soldiers, l20_id, awk_id))
+    return team
 
 
 if st.button("実行（N回）"):
     with st.spinner("計算中..."):
-        res = simulate_many(build_once, n=int(n_runs), seed=int(seed))
+        if vectorized:
+            run_batch = simulate_many_numba if NUMBA_AVAILABLE else simulate_many_vectorized
+            res = run_batch(make_team(slots_A), make_team(slots_B), tuning, n=int(n_runs), seed=int(seed))
+        else:
+            build_once = partial(run_once, make_team(slots_A), make_team(slots_B), tuning)
+            res = simulate_many(build_once, n=int(n_runs), seed=int(seed))
 
     st.subheader("勝率・兵損率")
     c1, c2, c3, c4, c5, c6 = st.columns(6)
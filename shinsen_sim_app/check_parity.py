@@ -0,0 +1,117 @@
+"""
+Engine.run_battle（1戦ずつ）と、simulate_many_vectorized / simulate_many_numba（一括計算）の結果がずれていないかを確かめる。
+data/ の武将・戦法・tuning で同じ編成を3通りに回し、勝率・引き分け率・平均兵損・戦法発動回数（1戦あたり）を比べる。
+乱数の引き方は実装ごとに違うので一致はせず、統計的な誤差の範囲（TOL / TOL_TRIG）に収まっていれば OK。
+
+    python check_parity.py [N]      # 既定 N=20000。NG があれば終了コード 1
+"""
+import json
+import sys
+from functools import partial
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from engine import Skill, Unit, run_once, simulate_many, simulate_many_vectorized
+from engine_numba import NUMBA_AVAILABLE, simulate_many_numba
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+
+# N=20000 で勝率の標準誤差は 0.0035 程度。実装どうしの差がこれを超えたらルールがずれている
+TOL = 0.02
+# 戦法発動回数（1戦あたり）は戦の長さに引きずられてばらつくので、相対誤差で見る
+TOL_TRIG = 0.05
+
+# data/skills.json の戦法は効果が未入力のものが多いので、効果の種類ごとに1つずつ足して回す
+EXTRA_SKILLS = [
+    Skill("CHK_FIRE", "火攻", "learn20", "start", 0.4,
+          [{"type": "strategy_damage", "rate": 1.5}, {"type": "status", "name": "confusion", "turns": 2}]),
+    Skill("CHK_CHARGE", "突撃", "learn20", "after_attack", 0.5, [{"type": "physical_damage", "rate": 1.2}]),
+    Skill("CHK_HEAL2", "療養", "awaken", "start", 0.5, [{"type": "heal", "target": "ally_lowest", "count": 2, "rate": 1.0}]),
+    Skill("CHK_HEALSELF", "自己回復", "awaken", "after_attack", 0.3, [{"type": "heal", "rate": 0.8}]),
+]
+
+
+def load_json(path: Path) -> Any:
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def make_unit(ud: Dict[str, Any], skill_map: Dict[str, Dict[str, Any]], soldiers: int,
+              learn20: Optional[Skill] = None, awaken: Optional[Skill] = None) -> Unit:
+    """app.py の make_unit と同じ組み立て（固有戦法は skills.json から引く）"""
+    base = ud.get("base_stats", {})
+    raw = skill_map.get(ud.get("unique_skill_id"), {})
+    unique = Skill(raw.get("skill_id", ""), raw.get("name", ud["name"]), "unique",
+                   raw.get("timing", "after_attack"), float(raw.get("proc", 0.0) or 0.0), raw.get("effects") or [])
+    return Unit(unit_id=ud["unit_id"], name=ud["name"],
+                str_=float(base.get("str", 0)), int_=float(base.get("int", 0)),
+                lea=float(base.get("lea", 0)), spd=float(base.get("spd", 0)),
+                max_soldiers=int(ud.get("max_soldiers", 10000)), soldiers=soldiers,
+                unique_skill=unique, learn20_skill=learn20, awaken_skill=awaken)
+
+
+def scenarios(units: List[Dict[str, Any]], skill_map: Dict[str, Dict[str, Any]]):
+    """(名前, A隊, B隊) を返す。勝率が 0/1 に張り付かず、引き分けも出る組み合わせにしている"""
+    a = [units[i] for i in (0, 2, 3)]
+    b = [units[i] for i in (1, 4, 5)]
+    yield "data_only", [make_unit(x, skill_map, 10000) for x in a], [make_unit(x, skill_map, 10000) for x in b]
+    fire, charge, heal2, heal_self = EXTRA_SKILLS
+    yield "all_effects", [
+        make_unit(a[0], skill_map, 10000, fire, heal2),
+        make_unit(a[1], skill_map, 8000, charge),
+        make_unit(a[2], skill_map, 10000, None, heal_self),
+    ], [
+        make_unit(b[0], skill_map, 10000, charge, fire),
+        make_unit(b[1], skill_map, 9000, heal2),
+        make_unit(b[2], skill_map, 10000),
+    ]
+
+
+def metrics(res: Dict[str, Any]) -> Dict[str, float]:
+    return {
+        "win_rate_A": res["win_rate_A"],
+        "draw_rate": res["draw_rate"],
+        "loss_A": res["loss_A"]["mean"],
+        "loss_B": res["loss_B"]["mean"],
+    }
+
+
+def worst_diff(res: Dict[str, Any], base: Dict[str, Any]) -> float:
+    """TOL / TOL_TRIG に対する比で一番大きいずれ（1 以下なら OK）"""
+    m, b = metrics(res), metrics(base)
+    worst = max(abs(m[k] - b[k]) for k in b) / TOL
+    trig, trig_b = res["skill_triggers_top"], base["skill_triggers_top"]
+    for name in trig.keys() | trig_b.keys():
+        per_a = trig.get(name, 0) / res["n"]
+        per_b = trig_b.get(name, 0) / base["n"]
+        worst = max(worst, abs(per_a - per_b) / max(per_b, 0.01) / TOL_TRIG)
+    return worst
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    units = load_json(DATA_DIR / "units.json")
+    skill_map = {s["skill_id"]: s for s in load_json(DATA_DIR / "skills.json") if s.get("skill_id")}
+    tuning = load_json(DATA_DIR / "tuning.json")
+
+    failed = 0
+    for name, team_a, team_b in scenarios(units, skill_map):
+        results = {
+            "scalar": simulate_many(partial(run_once, team_a, team_b, tuning), n=n, seed=1),
+            "vectorized": simulate_many_vectorized(team_a, team_b, tuning, n=n, seed=1),
+        }
+        if NUMBA_AVAILABLE:
+            results["numba"] = simulate_many_numba(team_a, team_b, tuning, n=n, seed=1)
+
+        print(f"== {name} (N={n})")
+        for impl, res in results.items():
+            m = metrics(res)
+            worst = worst_diff(res, results["scalar"])
+            ok = worst <= 1.0
+            failed += not ok
+            print(f"  {'OK' if ok else 'NG'}  {impl:<10} 勝率A={m['win_rate_A']:.4f} 引分={m['draw_rate']:.4f} "
+                  f"兵損A={m['loss_A']:.4f} 兵損B={m['loss_B']:.4f} ずれ={worst:.2f}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,22 @@
 from __future__ import annotations
-from dataclasses import dataclass, field
-from typing import List, Dict, Any, Optional, Callable
-import random
-import statistics
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, replace
+from typing import List, Dict, Any, Optional, Callable, Tuple
+import heapq
+import os
+import pickle
 
-@dataclass
-class Status:
-    name: str
-    turns_left: int
-    stacks: int = 1
+import numpy as np
 
-@dataclass
+# 状態異常は名前ではなく番号で持つ（Unit.turns_left / stacks の添字）
+STATUS_IDS = {"confusion": 0}
+
+
+def _no_status() -> List[int]:
+    return [0] * len(STATUS_IDS)
+
+@dataclass(slots=True)
 class Skill:
     skill_id: str
     name: str
@@ -19,42 +25,54 @@ class Skill:
     proc: float
     effects: List[Dict[str, Any]] = field(default_factory=list)
 
-@dataclass
+@dataclass(slots=True)
 class Unit:
     unit_id: str
     name: str
-    stats: Dict[str, float]      # str/int/lea/spd
+    str_: float                  # 武勇
+    int_: float                  # 知略
+    lea: float                   # 統率
+    spd: float                   # 速度
     max_soldiers: int
     soldiers: int
     unique_skill: Skill
     learn20_skill: Optional[Skill] = None
     awaken_skill: Optional[Skill] = None
-    statuses: Dict[str, Status] = field(default_factory=dict)
+    turns_left: List[int] = field(default_factory=_no_status)   # 状態ごとの残りターン（0 = なし）
+    stacks: List[int] = field(default_factory=_no_status)
+    _skills: Tuple[Skill, ...] = field(default=(), init=False, repr=False, compare=False)   # all_skills() の中身（構築時に固定）
+    # タイミング別・発動率 > 0 のものだけ（戦闘ループではこちらを回す）
+    _start_skills: Tuple[Skill, ...] = field(default=(), init=False, repr=False, compare=False)
+    _after_skills: Tuple[Skill, ...] = field(default=(), init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self._skills = tuple(sk for sk in (self.unique_skill, self.learn20_skill, self.awaken_skill) if sk)
+        self._start_skills = tuple(sk for sk in self._skills if sk.timing == "start" and sk.proc > 0)
+        self._after_skills = tuple(sk for sk in self._skills if sk.timing == "after_attack" and sk.proc > 0)
 
     def is_alive(self) -> bool:
         return self.soldiers > 0
 
     def has(self, status_name: str) -> bool:
-        return status_name in self.statuses and self.statuses[status_name].turns_left > 0
+        return self.turns_left[STATUS_IDS[status_name]] > 0
 
     def add_status(self, name: str, turns: int, stacks: int = 1):
-        if name in self.statuses:
-            self.statuses[name].turns_left = max(self.statuses[name].turns_left, turns)
-            self.statuses[name].stacks = min(self.statuses[name].stacks + stacks, 99)
+        i = STATUS_IDS[name]
+        if self.turns_left[i] > 0:
+            self.turns_left[i] = max(self.turns_left[i], turns)
+            self.stacks[i] = min(self.stacks[i] + stacks, 99)
         else:
-            self.statuses[name] = Status(name=name, turns_left=turns, stacks=stacks)
+            self.turns_left[i] = turns
+            self.stacks[i] = stacks
 
     def tick_statuses_end_of_turn(self):
-        for k in list(self.statuses.keys()):
-            self.statuses[k].turns_left -= 1
-            if self.statuses[k].turns_left <= 0:
-                del self.statuses[k]
+        tl = self.turns_left
+        for i, t in enumerate(tl):
+            if t > 0:
+                tl[i] = t - 1
 
     def all_skills(self) -> List[Skill]:
-        out = [self.unique_skill]
-        if self.learn20_skill: out.append(self.learn20_skill)
-        if self.awaken_skill: out.append(self.awaken_skill)
-        return out
+        return list(self._skills)
 
 @dataclass
 class BattleResult:
@@ -67,52 +85,71 @@ class BattleResult:
 class Engine:
     def __init__(self, tuning: Dict[str, Any], seed: int):
         self.T = tuning
-        self.rng = random.Random(seed)
-        self.triggers: Dict[str, int] = {}
+        self.atk_mix_lea = float(tuning.get("attack_mix_lea", 0.5))
+        self.def_phys = float(tuning.get("defense_factor_physical", 0.7))
+        self.scale_phys = float(tuning.get("physical_scale", 20.0))
+        self.def_strat = float(tuning.get("defense_factor_strategy", 0.8))
+        self.scale_strat = float(tuning.get("strategy_scale", 22.0))
+        self.scale_heal = float(tuning.get("heal_scale", 18.0))
+        self.max_turns = int(tuning.get("max_turns", 8))
+        self.confusion_skip = bool(tuning.get("confusion_skip_action", True))
+        self.rmin = float(tuning.get("random_min", 0.95))
+        self.rmax = float(tuning.get("random_max", 1.05))
+        self.rng = np.random.Generator(np.random.PCG64(seed))
+        self.triggers: Counter[str] = Counter()
+        self._r_uniform = iter(())
+        self._r_proc = iter(())
+
+    def _prepare_draws(self, all_units: List[Unit], max_turns: int):
+        """1戦で使いうる乱数の上限ぶんを先にまとめて引いておく（以降は next() で消費）"""
+        n_uniform = 0
+        n_proc = 0
+        for u in all_units:
+            skills = u._start_skills + u._after_skills
+            n_proc += 3 + len(skills)       # 行動順の同速判定 + 対象選択2回 + 発動判定
+            n_uniform += 1                  # 通常攻撃
+            for sk in skills:
+                for eff in sk.effects or []:
+                    n_uniform += max(1, int(eff.get("count", 1))) if eff.get("type") == "heal" else 1
+        self._r_uniform = iter(self.rng.uniform(self.rmin, self.rmax, size=n_uniform * max_turns).tolist())
+        self._r_proc = iter(self.rng.random(n_proc * max_turns).tolist())
 
     def _alive(self, team: List[Unit]) -> List[Unit]:
-        return [u for u in team if u.is_alive()]
+        return [u for u in team if u.soldiers > 0]
 
-    def _pick_enemy(self, enemy_team: List[Unit]) -> Optional[Unit]:
-        alive = self._alive(enemy_team)
-        return self.rng.choice(alive) if alive else None
+    def _pick_enemy(self, alive: List[Unit]) -> Optional[Unit]:
+        """alive は生存済みで絞り込んだ敵リスト"""
+        return alive[int(next(self._r_proc) * len(alive))] if alive else None
 
     def _pick_allies_lowest(self, team: List[Unit], count: int) -> List[Unit]:
-        alive = self._alive(team)
-        alive.sort(key=lambda u: u.soldiers)
-        return alive[:max(0, min(count, len(alive)))]
+        # nsmallest は同値なら元の並び順を保つ（sort と同じ結果）
+        return heapq.nsmallest(max(0, count), self._alive(team), key=lambda u: u.soldiers)
 
     def _record(self, sk: Skill):
-        self.triggers[sk.name] = self.triggers.get(sk.name, 0) + 1
+        self.triggers[sk.name] += 1
 
     # --- Tunable formulas ---
     def physical_damage(self, a: Unit, d: Unit, rate: float) -> int:
-        atk_mix_lea = float(self.T.get("attack_mix_lea", 0.5))
-        def_fac = float(self.T.get("defense_factor_physical", 0.7))
-        scale = float(self.T.get("physical_scale", 20.0))
-        atk = a.stats["str"] + atk_mix_lea * a.stats["lea"]
-        df  = d.stats["lea"]
-        base = max(0.0, atk - def_fac * df)
+        atk = a.str_ + self.atk_mix_lea * a.lea
+        df  = d.lea
+        base = max(0.0, atk - self.def_phys * df)
         troop_scale = (a.soldiers / a.max_soldiers) if a.max_soldiers else 1.0
-        dmg = base * rate * scale * troop_scale
-        dmg *= self.rng.uniform(float(self.T.get("random_min", 0.95)), float(self.T.get("random_max", 1.05)))
+        dmg = base * rate * self.scale_phys * troop_scale
+        dmg *= next(self._r_uniform)
         return int(max(1, dmg))
 
     def strategy_damage(self, a: Unit, d: Unit, rate: float) -> int:
-        def_fac = float(self.T.get("defense_factor_strategy", 0.8))
-        scale = float(self.T.get("strategy_scale", 22.0))
-        atk = a.stats["int"]
-        df  = d.stats["int"]
-        base = max(0.0, atk - def_fac * df)
+        atk = a.int_
+        df  = d.int_
+        base = max(0.0, atk - self.def_strat * df)
         troop_scale = (a.soldiers / a.max_soldiers) if a.max_soldiers else 1.0
-        dmg = base * rate * scale * troop_scale
-        dmg *= self.rng.uniform(float(self.T.get("random_min", 0.95)), float(self.T.get("random_max", 1.05)))
+        dmg = base * rate * self.scale_strat * troop_scale
+        dmg *= next(self._r_uniform)
         return int(max(1, dmg))
 
     def heal(self, h: Unit, t: Unit, rate: float) -> int:
-        scale = float(self.T.get("heal_scale", 18.0))
-        base = h.stats["int"] * rate * scale
-        base *= self.rng.uniform(float(self.T.get("random_min", 0.95)), float(self.T.get("random_max", 1.05)))
+        base = h.int_ * rate * self.scale_heal
+        base *= next(self._r_uniform)
         amt = int(max(1, base))
         t.soldiers = min(t.max_soldiers, t.soldiers + amt)
         return amt
@@ -121,6 +158,9 @@ class Engine:
     def _apply_effects(self, sk: Skill, self_u: Unit, enemy_u: Unit, team_self: List[Unit], team_enemy: List[Unit]):
         for eff in sk.effects or []:
             et = eff.get("type")
+            # 先の効果で対象が倒れていたら、対象を取る効果は計算しない
+            if enemy_u.soldiers <= 0 and et != "heal":
+                continue
             if et == "physical_damage":
                 dmg = self.physical_damage(self_u, enemy_u, float(eff.get("rate", 1.0)))
                 enemy_u.soldiers = max(0, enemy_u.soldiers - dmg)
@@ -137,54 +177,64 @@ class Engine:
                     enemy_u.add_status("confusion", int(eff.get("turns", 1)))
 
     def run_battle(self, team_a: List[Unit], team_b: List[Unit]) -> BattleResult:
-        max_turns = int(self.T.get("max_turns", 8))
+        max_turns = self.max_turns
         all_units = team_a + team_b
         a_initial = sum(u.soldiers for u in team_a)
         b_initial = sum(u.soldiers for u in team_b)
+        self._prepare_draws(all_units, max_turns)
+        # 自軍/敵軍は id で引く（Unit は dataclass の == 比較なので、`in` だと同じ武将・同じ兵数の敵味方を取り違える）
+        teams = {id(u): (team_a, team_b) for u in team_a}
+        teams.update({id(u): (team_b, team_a) for u in team_b})
+        # 生存リストは陣営ごとに持ち回し、撃破が出たときだけ作り直す（回復では復活しない）
+        alive = {id(team_a): self._alive(team_a), id(team_b): self._alive(team_b)}
 
         for turn in range(1, max_turns + 1):
-            if not self._alive(team_a):
+            if not alive[id(team_a)]:
                 return self._final("B", turn-1, a_initial, b_initial, team_a, team_b)
-            if not self._alive(team_b):
+            if not alive[id(team_b)]:
                 return self._final("A", turn-1, a_initial, b_initial, team_a, team_b)
 
-            order = sorted([u for u in all_units if u.is_alive()],
-                           key=lambda u: (u.stats.get("spd", 0.0), self.rng.random()),
+            order = sorted(alive[id(team_a)] + alive[id(team_b)],
+                           key=lambda u: (u.spd, next(self._r_proc)),
                            reverse=True)
 
             # start timing skills
             for u in order:
-                if not u.is_alive(): continue
-                if self.T.get("confusion_skip_action", True) and u.has("confusion"):
+                if u.soldiers <= 0: continue
+                if self.confusion_skip and u.has("confusion"):
                     continue
-                enemy_team = team_b if u in team_a else team_a
-                target = self._pick_enemy(enemy_team)
+                own_team, enemy_team = teams[id(u)]
+                target = self._pick_enemy(alive[id(enemy_team)])
                 if not target: continue
-                for sk in u.all_skills():
-                    if sk.timing == "start" and self.rng.random() < sk.proc:
+                for sk in u._start_skills:
+                    if next(self._r_proc) < sk.proc:
                         self._record(sk)
-                        self._apply_effects(sk, u, target, team_a if u in team_a else team_b, enemy_team)
+                        self._apply_effects(sk, u, target, own_team, enemy_team)
+                if target.soldiers <= 0:
+                    alive[id(enemy_team)] = self._alive(enemy_team)
 
             # normal attack + after_attack
             for u in order:
-                if not u.is_alive(): continue
-                if self.T.get("confusion_skip_action", True) and u.has("confusion"):
+                if u.soldiers <= 0: continue
+                if self.confusion_skip and u.has("confusion"):
                     continue
-                enemy_team = team_b if u in team_a else team_a
-                target = self._pick_enemy(enemy_team)
+                own_team, enemy_team = teams[id(u)]
+                target = self._pick_enemy(alive[id(enemy_team)])
                 if not target: continue
 
                 dmg = self.physical_damage(u, target, 1.0)
                 target.soldiers = max(0, target.soldiers - dmg)
 
-                if target.is_alive():
-                    for sk in u.all_skills():
-                        if sk.timing == "after_attack" and self.rng.random() < sk.proc:
+                if target.soldiers > 0:
+                    for sk in u._after_skills:
+                        if next(self._r_proc) < sk.proc:
                             self._record(sk)
-                            self._apply_effects(sk, u, target, team_a if u in team_a else team_b, enemy_team)
+                            self._apply_effects(sk, u, target, own_team, enemy_team)
+                if target.soldiers <= 0:
+                    alive[id(enemy_team)] = self._alive(enemy_team)
 
             for u in all_units:
-                if u.is_alive():
+                if u.soldiers > 0:
                     u.tick_statuses_end_of_turn()
 
         return self._final("draw", max_turns, a_initial, b_initial, team_a, team_b)
@@ -196,37 +246,254 @@ class Engine:
         b_loss = (b_initial - b_now) / b_initial if b_initial else 0.0
         return BattleResult(winner, turns, a_loss, b_loss, dict(self.triggers))
 
-def simulate_many(build_once: Callable[[int], BattleResult], n: int, seed: int = 0) -> Dict[str, Any]:
-    rng = random.Random(seed)
-    wins = {"A": 0, "B": 0, "draw": 0}
-    a_losses, b_losses = [], []
-    trig: Dict[str, int] = {}
+def _loss_stats(xs: np.ndarray) -> Dict[str, float]:
+    if not len(xs):
+        return {"mean": 0.0, "median": 0.0, "min": 0.0, "max": 0.0, "stdev": 0.0}
+    return {
+        "mean": float(xs.mean()),
+        "median": float(np.median(xs)),
+        "min": float(xs.min()),
+        "max": float(xs.max()),
+        "stdev": float(xs.std()),
+    }
 
-    for _ in range(n):
-        res = build_once(rng.randint(0, 10**9))
-        wins[res.winner] += 1
-        a_losses.append(res.a_loss_rate)
-        b_losses.append(res.b_loss_rate)
-        for k,v in res.triggers.items():
-            trig[k] = trig.get(k, 0) + v
-
-    def stats(xs: List[float]) -> Dict[str, float]:
-        return {
-            "mean": float(statistics.mean(xs)) if xs else 0.0,
-            "median": float(statistics.median(xs)) if xs else 0.0,
-            "min": float(min(xs)) if xs else 0.0,
-            "max": float(max(xs)) if xs else 0.0,
-            "stdev": float(statistics.pstdev(xs)) if xs else 0.0,
-        }
-
-    trig_top = dict(sorted(trig.items(), key=lambda x: x[1], reverse=True)[:15])
+
+def summarize_results(n: int, wins: Dict[str, int], a_losses: np.ndarray, b_losses: np.ndarray, trig: Counter[str]) -> Dict[str, Any]:
+    """勝敗数・損耗率・戦法発動回数を simulate_many 系の戻り値の形にまとめる（各バッチ版でも共通で使う）"""
+    trig_top = dict(trig.most_common(15))
     return {
         "n": n,
         "wins": wins,
         "win_rate_A": wins["A"]/n if n else 0.0,
         "win_rate_B": wins["B"]/n if n else 0.0,
         "draw_rate": wins["draw"]/n if n else 0.0,
-        "loss_A": stats(a_losses),
-        "loss_B": stats(b_losses),
+        "loss_A": _loss_stats(a_losses),
+        "loss_B": _loss_stats(b_losses),
         "skill_triggers_top": trig_top,
     }
+
+
+def run_once(team_a_spec: List[Unit], team_b_spec: List[Unit], tuning: Dict[str, Any], seed: int) -> BattleResult:
+    """
+    make_unit 済みの武将を複製して1戦だけ行う。
+    functools.partial(run_once, team_a, team_b, tuning) を simulate_many の build_once に渡すと、
+    別プロセスにもそのまま送れる（app.py のクロージャに依存しない）。
+    """
+    team_a = [replace(u, turns_left=_no_status(), stacks=_no_status()) for u in team_a_spec]
+    team_b = [replace(u, turns_left=_no_status(), stacks=_no_status()) for u in team_b_spec]
+    return Engine(tuning, seed=seed).run_battle(team_a, team_b)
+
+
+def _run_chunk(build_once: Callable[[int], BattleResult], seeds: List[int]) -> Tuple[Dict[str, int], np.ndarray, np.ndarray, Counter[str]]:
+    wins = {"A": 0, "B": 0, "draw": 0}
+    a_losses = np.empty(len(seeds), dtype=np.float32)
+    b_losses = np.empty(len(seeds), dtype=np.float32)
+    trig: Counter[str] = Counter()
+
+    for i, s in enumerate(seeds):
+        res = build_once(s)
+        wins[res.winner] += 1
+        a_losses[i] = res.a_loss_rate
+        b_losses[i] = res.b_loss_rate
+        trig.update(res.triggers)
+
+    return wins, a_losses, b_losses, trig
+
+
+# これより少ない回数はプロセス起動（Windows は spawn）のほうが高くつくので1プロセスで回す
+PARALLEL_MIN_N = 2000
+
+
+def simulate_many(build_once: Callable[[int], BattleResult], n: int, seed: int = 0, workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    build_once(seed) を n 回呼んで集計する。
+    n >= PARALLEL_MIN_N かつ build_once が pickle できる場合は、seed を workers 個（既定は CPU数）に分けて
+    ProcessPoolExecutor で並列に回す。
+    """
+    seeds = np.random.Generator(np.random.PCG64(seed)).integers(0, 10**9, size=n).tolist()
+    workers = workers or os.cpu_count() or 1
+
+    parallel = workers > 1 and n >= PARALLEL_MIN_N
+    if parallel:
+        try:
+            pickle.dumps(build_once)
+        except (pickle.PicklingError, AttributeError, TypeError):
+            parallel = False
+
+    if parallel:
+        size = -(-n // workers)
+        chunks = [seeds[i:i + size] for i in range(0, n, size)]
+        with ProcessPoolExecutor(max_workers=len(chunks)) as pool:
+            parts = list(pool.map(_run_chunk, [build_once] * len(chunks), chunks))
+    else:
+        parts = [_run_chunk(build_once, seeds)]
+
+    wins = {"A": 0, "B": 0, "draw": 0}
+    trig: Counter[str] = Counter()
+    for w, _, _, tr in parts:
+        for k, v in w.items():
+            wins[k] += v
+        trig.update(tr)
+    a_losses = np.concatenate([p[1] for p in parts])
+    b_losses = np.concatenate([p[2] for p in parts])
+
+    return summarize_results(n, wins, a_losses, b_losses, trig)
+
+
+def simulate_many_vectorized(team_a_spec: List[Unit], team_b_spec: List[Unit], tuning: Dict[str, Any], n: int, seed: int = 0) -> Dict[str, Any]:
+    """
+    simulate_many と同じ集計を、N戦ぶんの兵数・状態を (N, 6) 配列に並べて一括で回す版。
+    ルールは Engine.run_battle と同じ（行動順・対象選択・発動判定を全戦まとめて乱数で引く）。
+    team_*_spec は make_unit 済みの武将（兵数は初期値として読むだけで書き換えない）。
+    """
+    rng = np.random.Generator(np.random.PCG64(seed))
+    units = list(team_a_spec) + list(team_b_spec)
+    n_a = len(team_a_spec)
+    n_u = len(units)
+
+    max_turns = int(tuning.get("max_turns", 8))
+    atk_mix_lea = float(tuning.get("attack_mix_lea", 0.5))
+    def_phys = float(tuning.get("defense_factor_physical", 0.7))
+    scale_phys = float(tuning.get("physical_scale", 20.0))
+    def_strat = float(tuning.get("defense_factor_strategy", 0.8))
+    scale_strat = float(tuning.get("strategy_scale", 22.0))
+    scale_heal = float(tuning.get("heal_scale", 18.0))
+    rmin = float(tuning.get("random_min", 0.95))
+    rmax = float(tuning.get("random_max", 1.05))
+    confusion_skip = bool(tuning.get("confusion_skip_action", True))
+
+    # 武将ごとの固定値（全戦共通）
+    st_str = np.array([u.str_ for u in units], dtype=np.float32)
+    st_int = np.array([u.int_ for u in units], dtype=np.float32)
+    st_lea = np.array([u.lea for u in units], dtype=np.float32)
+    st_spd = np.array([u.spd for u in units], dtype=np.float64)   # 並べ替えキー（微小な揺らぎを足すので float64）
+    max_soldiers = np.array([u.max_soldiers for u in units], dtype=np.float32)
+    side_a = np.arange(n_u) < n_a
+
+    # 戦ごとに変わる状態
+    soldiers = np.tile(np.array([u.soldiers for u in units], dtype=np.float32), (n, 1))
+    confusion = np.zeros((n, n_u), dtype=np.int16)
+    alive = soldiers > 0                           # 撃破時だけ hit() で落とす（回復では復活しない）
+    active = np.ones(n, dtype=bool)
+    winner = np.full(n, 2, dtype=np.int8)          # 0: A / 1: B / 2: draw
+    a_initial = soldiers[:, :n_a].sum(1)
+    b_initial = soldiers[:, n_a:].sum(1)
+    rows = np.arange(n)
+    trig: Counter[str] = Counter()
+    spd_mat = np.broadcast_to(st_spd, (n, n_u))
+
+    def troop_scale(idx: np.ndarray, a: np.ndarray) -> np.ndarray:
+        ms = max_soldiers[a]
+        return np.where(ms > 0, soldiers[idx, a] / np.where(ms > 0, ms, 1.0), 1.0)
+
+    def hit(idx: np.ndarray, a: np.ndarray, d: np.ndarray, rate: float, kind: str):
+        cur = soldiers[idx, d]
+        live = cur > 0
+        if not live.all():     # 既に倒れている対象の行は計算しない
+            idx, a, d, cur = idx[live], a[live], d[live], cur[live]
+        if kind == "physical":
+            atk = st_str[a] + atk_mix_lea * st_lea[a]
+            base = np.maximum(0.0, atk - def_phys * st_lea[d]) * scale_phys
+        else:
+            base = np.maximum(0.0, st_int[a] - def_strat * st_int[d]) * scale_strat
+        dmg = base * rate * troop_scale(idx, a) * rng.uniform(rmin, rmax, len(idx))
+        np.floor(np.maximum(dmg, 1.0, out=dmg), out=dmg)
+        cur -= dmg
+        soldiers[idx, d] = np.maximum(cur, 0.0, out=cur)
+        alive[idx, d] = cur > 0
+
+    def heal(idx: np.ndarray, h: int, t: np.ndarray, rate: float):
+        amt = st_int[h] * rate * scale_heal * rng.uniform(rmin, rmax, len(idx))
+        amt = np.floor(np.maximum(1.0, amt))
+        soldiers[idx, t] = np.minimum(max_soldiers[t], soldiers[idx, t] + amt)
+
+    def apply_effects(sk: Skill, u: int, idx: np.ndarray, target: np.ndarray):
+        a = np.full(len(idx), u)
+        for eff in sk.effects or []:
+            et = eff.get("type")
+            if et == "physical_damage":
+                hit(idx, a, target, float(eff.get("rate", 1.0)), "physical")
+            elif et == "strategy_damage":
+                hit(idx, a, target, float(eff.get("rate", 1.0)), "strategy")
+            elif et == "heal":
+                rate = float(eff.get("rate", 1.0))
+                if eff.get("target") == "ally_lowest":
+                    lo, hi = (0, n_a) if side_a[u] else (n_a, n_u)
+                    count = max(0, min(int(eff.get("count", 1)), hi - lo))
+                    own = soldiers[idx, lo:hi]
+                    ranked = np.argsort(np.where(own > 0, own, np.inf), axis=1, kind="stable")
+                    for j in range(count):
+                        t = lo + ranked[:, j]
+                        ok = alive[idx, t]
+                        heal(idx[ok], u, t[ok], rate)
+                else:
+                    heal(idx, u, a, rate)
+            elif et == "status":
+                if eff.get("name") == "confusion":
+                    confusion[idx, target] = np.maximum(confusion[idx, target], int(eff.get("turns", 1)))
+
+    def fire_skills(u: int, skills: Tuple[Skill, ...], idx: np.ndarray, target: np.ndarray):
+        for sk in skills:
+            fired = rng.random(len(idx)) < sk.proc
+            if not fired.any():
+                continue
+            trig[sk.name] += int(fired.sum())
+            apply_effects(sk, u, idx[fired], target[fired])
+
+    def act(order: np.ndarray, k: int, timing: str):
+        slot = order[:, k:k + 1]
+        actor = slot[:, 0]
+        can_act = active & np.take_along_axis(alive, slot, axis=1)[:, 0]
+        if confusion_skip:
+            can_act &= np.take_along_axis(confusion, slot, axis=1)[:, 0] <= 0
+        # 生存している敵から一様に1体選ぶ（死亡・味方は -1 にして argmax から外す）
+        enemy = alive & (side_a[None, :] != side_a[actor][:, None])
+        keys = np.where(enemy, rng.random((n, n_u)), -1.0)
+        target = keys.argmax(1)
+        can_act &= enemy.any(1)
+
+        if timing == "attack":
+            idx = rows[can_act]
+            a, d = actor[idx], target[idx]
+            hit(idx, a, d, 1.0, "physical")
+            can_act[idx] = soldiers[idx, d] > 0
+
+        for u in range(n_u):
+            skills = units[u]._start_skills if timing == "start" else units[u]._after_skills
+            if not skills:
+                continue
+            idx = rows[can_act & (actor == u)]
+            if len(idx):
+                fire_skills(u, skills, idx, target[idx])
+
+    for _ in range(max_turns):
+        a_alive = alive[:, :n_a].any(1)
+        b_alive = alive[:, n_a:].any(1)
+        ended = active & ~(a_alive & b_alive)
+        winner[ended & ~a_alive] = 1
+        winner[ended & a_alive] = 0
+        active &= ~ended
+        if not active.any():
+            break
+
+        # 速度の降順、同速はランダム（1e-6 未満の揺らぎで同速だけを入れ替える）
+        order = np.argsort(-(spd_mat + rng.uniform(0.0, 1e-6, (n, n_u))), axis=1)
+
+        for k in range(n_u):
+            act(order, k, "start")
+        for k in range(n_u):
+            act(order, k, "attack")
+
+        ticking = active[:, None] & alive
+        confusion[ticking] = np.maximum(confusion[ticking] - 1, 0)
+
+    a_now = soldiers[:, :n_a].sum(1)
+    b_now = soldiers[:, n_a:].sum(1)
+    a_losses = np.where(a_initial > 0, (a_initial - a_now) / np.where(a_initial > 0, a_initial, 1.0), 0.0)
+    b_losses = np.where(b_initial > 0, (b_initial - b_now) / np.where(b_initial > 0, b_initial, 1.0), 0.0)
+    wins = {
+        "A": int(np.count_nonzero(winner == 0)),
+        "B": int(np.count_nonzero(winner == 1)),
+        "draw": int(np.count_nonzero(winner == 2)),
+    }
+    return summarize_results(n, wins, a_losses, b_losses, trig)
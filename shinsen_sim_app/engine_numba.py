@@ -0,0 +1,360 @@
+"""
+Engine.run_battle の計算部分を Numba で機械語にコンパイルした版。
+武将・戦法は数値配列に詰め替えてから渡す（戦ごとに変わるのは兵数と混乱ターンだけ）。
+numba が入っていない環境では同じコードを素の Python として動かす（遅いが結果の形は同じ）。
+"""
+from __future__ import annotations
+from collections import Counter
+from typing import Any, Dict, List
+import threading
+
+import numpy as np
+
+from engine import Unit, summarize_results
+
+try:
+    import numba
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    prange = range
+
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+        return lambda f: f
+
+
+def _omp_available() -> bool:
+    try:
+        import numba.np.ufunc.omppool  # noqa: F401
+    except (ImportError, OSError):
+        return False
+    return True
+
+
+# Streamlit はセッションごとに別スレッドから呼ぶ。workqueue 層は同時に呼ぶとプロセスごと落ち、
+# TBB 層はメインスレッド以外から呼ぶと終了時に固まるので、並列版は OpenMP 層に固定できるときだけ使う
+PARALLEL = NUMBA_AVAILABLE and _omp_available()
+if PARALLEL:
+    numba.config.THREADING_LAYER = "omp"
+# run_battles は1度に1スレッドだけが呼ぶ
+_RUN_LOCK = threading.Lock()
+
+# 発動タイミング
+TIMING_NONE = 0
+TIMING_START = 1
+TIMING_AFTER = 2
+
+# 効果の種類
+EFF_NONE = 0
+EFF_PHYSICAL = 1
+EFF_STRATEGY = 2
+EFF_HEAL = 3
+EFF_CONFUSION = 4
+
+# tuning_arr の並び
+T_ATK_MIX_LEA, T_DEF_PHYS, T_SCALE_PHYS, T_DEF_STRAT, T_SCALE_STRAT, T_SCALE_HEAL, T_RMIN, T_RMAX, T_CONF_SKIP = range(9)
+
+MAX_SKILLS = 3
+CHUNK = 4096    # 乱数バッファを一度に確保する戦数
+
+
+@njit(cache=True)
+def _jitter(tun, r):
+    return tun[T_RMIN] + (tun[T_RMAX] - tun[T_RMIN]) * r
+
+
+@njit(cache=True)
+def _hit(soldiers, stats, max_sold, tun, a, d, rate, kind, r):
+    if kind == EFF_PHYSICAL:
+        atk = stats[a, 0] + tun[T_ATK_MIX_LEA] * stats[a, 2]
+        base = max(0.0, atk - tun[T_DEF_PHYS] * stats[d, 2]) * tun[T_SCALE_PHYS]
+    else:
+        base = max(0.0, stats[a, 1] - tun[T_DEF_STRAT] * stats[d, 1]) * tun[T_SCALE_STRAT]
+    troop_scale = soldiers[a] / max_sold[a] if max_sold[a] > 0 else 1.0
+    dmg = np.floor(max(1.0, base * rate * troop_scale * _jitter(tun, r)))
+    soldiers[d] = max(0.0, soldiers[d] - dmg)
+
+
+@njit(cache=True)
+def _heal(soldiers, stats, max_sold, tun, h, t, rate, r):
+    amt = np.floor(max(1.0, stats[h, 1] * rate * tun[T_SCALE_HEAL] * _jitter(tun, r)))
+    soldiers[t] = min(max_sold[t], soldiers[t] + amt)
+
+
+@njit(cache=True)
+def _pick_enemy(soldiers, side_a, is_a, r):
+    cnt = 0
+    for j in range(soldiers.shape[0]):
+        if side_a[j] != is_a and soldiers[j] > 0:
+            cnt += 1
+    if cnt == 0:
+        return -1
+    k = int(r * cnt)
+    for j in range(soldiers.shape[0]):
+        if side_a[j] != is_a and soldiers[j] > 0:
+            if k == 0:
+                return j
+            k -= 1
+    return -1
+
+
+@njit(cache=True)
+def _apply_effects(u, s, t, soldiers, confusion, stats, max_sold, side_a,
+                   eff_type, eff_rate, eff_count, eff_turns, tun, buf, pos):
+    n_u = soldiers.shape[0]
+    for e in range(eff_type.shape[2]):
+        et = eff_type[u, s, e]
+        if et != EFF_HEAL and soldiers[t] <= 0:     # 対象が倒れていたら対象を取る効果は飛ばす
+            continue
+        if et == EFF_PHYSICAL or et == EFF_STRATEGY:
+            _hit(soldiers, stats, max_sold, tun, u, t, eff_rate[u, s, e], et, buf[pos])
+            pos += 1
+        elif et == EFF_HEAL:
+            count = eff_count[u, s, e]
+            if count < 0:
+                _heal(soldiers, stats, max_sold, tun, u, u, eff_rate[u, s, e], buf[pos])
+                pos += 1
+                continue
+            # 生存している味方を兵数の少ない順に count 名（同数は並び順）
+            picked = np.empty(n_u, np.int64)
+            m = 0
+            for j in range(n_u):
+                if side_a[j] == side_a[u] and soldiers[j] > 0:
+                    i = m
+                    while i > 0 and soldiers[picked[i - 1]] > soldiers[j]:
+                        picked[i] = picked[i - 1]
+                        i -= 1
+                    picked[i] = j
+                    m += 1
+            for i in range(min(count, m)):
+                _heal(soldiers, stats, max_sold, tun, u, picked[i], eff_rate[u, s, e], buf[pos])
+                pos += 1
+        elif et == EFF_CONFUSION:
+            confusion[t] = max(confusion[t], eff_turns[u, s, e])
+    return pos
+
+
+@njit(cache=True)
+def _battle(b, stats, side_a, soldiers0, max_sold, sk_proc, sk_timing,
+            eff_type, eff_rate, eff_count, eff_turns, tun, buf, max_turns, fired):
+    n_u = soldiers0.shape[0]
+    n_sk = sk_proc.shape[1]
+    soldiers = soldiers0.copy()
+    confusion = np.zeros(n_u, np.int64)
+    order = np.empty(n_u, np.int64)
+    tiebreak = np.empty(n_u)
+    conf_skip = tun[T_CONF_SKIP] > 0
+    pos = 0
+    winner = 2
+
+    for _ in range(max_turns):
+        a_alive = False
+        b_alive = False
+        for j in range(n_u):
+            if soldiers[j] > 0:
+                if side_a[j]:
+                    a_alive = True
+                else:
+                    b_alive = True
+        if not a_alive:
+            winner = 1
+            break
+        if not b_alive:
+            winner = 0
+            break
+
+        # 速度の降順、同速はランダム
+        for j in range(n_u):
+            tiebreak[j] = buf[pos]
+            pos += 1
+            i = j
+            while i > 0 and (stats[order[i - 1], 3] < stats[j, 3]
+                             or (stats[order[i - 1], 3] == stats[j, 3] and tiebreak[order[i - 1]] < tiebreak[j])):
+                order[i] = order[i - 1]
+                i -= 1
+            order[i] = j
+
+        for phase in range(2):
+            for k in range(n_u):
+                u = order[k]
+                if soldiers[u] <= 0:
+                    continue
+                if conf_skip and confusion[u] > 0:
+                    continue
+                t = _pick_enemy(soldiers, side_a, side_a[u], buf[pos])
+                pos += 1
+                if t < 0:
+                    continue
+                if phase == 0:
+                    timing = TIMING_START
+                else:
+                    _hit(soldiers, stats, max_sold, tun, u, t, 1.0, EFF_PHYSICAL, buf[pos])
+                    pos += 1
+                    if soldiers[t] <= 0:
+                        continue
+                    timing = TIMING_AFTER
+                for s in range(n_sk):
+                    if sk_timing[u, s] != timing:
+                        continue
+                    r = buf[pos]
+                    pos += 1
+                    if r < sk_proc[u, s]:
+                        fired[b, u, s] += 1
+                        pos = _apply_effects(u, s, t, soldiers, confusion, stats, max_sold, side_a,
+                                             eff_type, eff_rate, eff_count, eff_turns, tun, buf, pos)
+
+        for j in range(n_u):
+            if soldiers[j] > 0 and confusion[j] > 0:
+                confusion[j] -= 1
+
+    a_init = 0.0
+    b_init = 0.0
+    a_now = 0.0
+    b_now = 0.0
+    for j in range(n_u):
+        if side_a[j]:
+            a_init += soldiers0[j]
+            a_now += soldiers[j]
+        else:
+            b_init += soldiers0[j]
+            b_now += soldiers[j]
+    a_loss = (a_init - a_now) / a_init if a_init > 0 else 0.0
+    b_loss = (b_init - b_now) / b_init if b_init > 0 else 0.0
+    return winner, a_loss, b_loss
+
+
+@njit(cache=True, parallel=True)
+def _run_battles_parallel(stats, side_a, soldiers0, max_sold, sk_proc, sk_timing,
+                          eff_type, eff_rate, eff_count, eff_turns, tun, rand_buf, max_turns):
+    """rand_buf の1行 = 1戦ぶんの乱数。戦ごとに独立なのでそのまま並列に回す。"""
+    n = rand_buf.shape[0]
+    winner = np.empty(n, np.int8)
+    a_loss = np.empty(n)
+    b_loss = np.empty(n)
+    fired = np.zeros((n, sk_proc.shape[0], sk_proc.shape[1]), np.int64)
+    for b in prange(n):
+        w, la, lb = _battle(b, stats, side_a, soldiers0, max_sold, sk_proc, sk_timing,
+                            eff_type, eff_rate, eff_count, eff_turns, tun, rand_buf[b], max_turns, fired)
+        winner[b] = w
+        a_loss[b] = la
+        b_loss[b] = lb
+    return winner, a_loss, b_loss, fired
+
+
+# キャッシュはソースの位置で引かれるので、順に回す版は別の関数として持つ
+@njit(cache=True)
+def _run_battles_serial(stats, side_a, soldiers0, max_sold, sk_proc, sk_timing,
+                        eff_type, eff_rate, eff_count, eff_turns, tun, rand_buf, max_turns):
+    """_run_battles_parallel と同じ計算を1スレッドで回す。"""
+    n = rand_buf.shape[0]
+    winner = np.empty(n, np.int8)
+    a_loss = np.empty(n)
+    b_loss = np.empty(n)
+    fired = np.zeros((n, sk_proc.shape[0], sk_proc.shape[1]), np.int64)
+    for b in range(n):
+        w, la, lb = _battle(b, stats, side_a, soldiers0, max_sold, sk_proc, sk_timing,
+                            eff_type, eff_rate, eff_count, eff_turns, tun, rand_buf[b], max_turns, fired)
+        winner[b] = w
+        a_loss[b] = la
+        b_loss[b] = lb
+    return winner, a_loss, b_loss, fired
+
+
+run_battles = _run_battles_parallel if PARALLEL else _run_battles_serial
+
+
+def _encode(units: List[Unit]) -> Dict[str, Any]:
+    n_u = len(units)
+    n_eff = max([len(sk.effects or []) for u in units for sk in u._start_skills + u._after_skills] + [1])
+    enc = {
+        "stats": np.array([[u.str_, u.int_, u.lea, u.spd] for u in units], dtype=np.float64),
+        "soldiers0": np.array([u.soldiers for u in units], dtype=np.float64),
+        "max_sold": np.array([u.max_soldiers for u in units], dtype=np.float64),
+        "sk_proc": np.zeros((n_u, MAX_SKILLS)),
+        "sk_timing": np.zeros((n_u, MAX_SKILLS), np.int64),
+        "eff_type": np.zeros((n_u, MAX_SKILLS, n_eff), np.int64),
+        "eff_rate": np.zeros((n_u, MAX_SKILLS, n_eff)),
+        "eff_count": np.zeros((n_u, MAX_SKILLS, n_eff), np.int64),   # 回復対象数（-1 は自分）
+        "eff_turns": np.zeros((n_u, MAX_SKILLS, n_eff), np.int64),
+    }
+    names: List[List[str]] = []
+    draws = 0
+    for i, u in enumerate(units):
+        skills = u._start_skills + u._after_skills     # 発動しえない戦法は積まない
+        names.append([sk.name for sk in skills])
+        draws += 4 + len(skills)        # 同速判定 + 対象選択2回 + 通常攻撃 + 発動判定
+        for s, sk in enumerate(skills):
+            enc["sk_proc"][i, s] = sk.proc
+            enc["sk_timing"][i, s] = {"start": TIMING_START, "after_attack": TIMING_AFTER}.get(sk.timing, TIMING_NONE)
+            for e, eff in enumerate(sk.effects or []):
+                et = eff.get("type")
+                enc["eff_rate"][i, s, e] = float(eff.get("rate", 1.0))
+                if et == "physical_damage":
+                    enc["eff_type"][i, s, e] = EFF_PHYSICAL
+                elif et == "strategy_damage":
+                    enc["eff_type"][i, s, e] = EFF_STRATEGY
+                elif et == "heal":
+                    enc["eff_type"][i, s, e] = EFF_HEAL
+                    if eff.get("target") == "ally_lowest":
+                        enc["eff_count"][i, s, e] = max(0, int(eff.get("count", 1)))
+                    else:
+                        enc["eff_count"][i, s, e] = -1     # 自分自身
+                elif et == "status" and eff.get("name") == "confusion":
+                    enc["eff_type"][i, s, e] = EFF_CONFUSION
+                    enc["eff_turns"][i, s, e] = int(eff.get("turns", 1))
+                if et in ("physical_damage", "strategy_damage"):
+                    draws += 1
+                elif et == "heal":
+                    draws += max(1, int(enc["eff_count"][i, s, e]))
+    enc["names"] = names
+    enc["draws_per_turn"] = draws
+    return enc
+
+
+def simulate_many_numba(team_a_spec: List[Unit], team_b_spec: List[Unit], tuning: Dict[str, Any], n: int, seed: int = 0) -> Dict[str, Any]:
+    """simulate_many_vectorized と同じ引数・戻り値。1戦ごとのループを run_battles に任せる。"""
+    units = list(team_a_spec) + list(team_b_spec)
+    enc = _encode(units)
+    side_a = np.arange(len(units)) < len(team_a_spec)
+    max_turns = int(tuning.get("max_turns", 8))
+    tun = np.array([
+        float(tuning.get("attack_mix_lea", 0.5)),
+        float(tuning.get("defense_factor_physical", 0.7)),
+        float(tuning.get("physical_scale", 20.0)),
+        float(tuning.get("defense_factor_strategy", 0.8)),
+        float(tuning.get("strategy_scale", 22.0)),
+        float(tuning.get("heal_scale", 18.0)),
+        float(tuning.get("random_min", 0.95)),
+        float(tuning.get("random_max", 1.05)),
+        1.0 if tuning.get("confusion_skip_action", True) else 0.0,
+    ])
+
+    rng = np.random.Generator(np.random.PCG64(seed))
+    wins = {"A": 0, "B": 0, "draw": 0}
+    a_losses = np.empty(n, dtype=np.float32)
+    b_losses = np.empty(n, dtype=np.float32)
+    fired_total = np.zeros(enc["sk_proc"].shape, np.int64)
+    for start in range(0, n, CHUNK):
+        m = min(CHUNK, n - start)
+        rand_buf = rng.random((m, enc["draws_per_turn"] * max_turns))
+        with _RUN_LOCK:
+            winner, a_loss, b_loss, fired = run_battles(
+                enc["stats"], side_a, enc["soldiers0"], enc["max_sold"], enc["sk_proc"], enc["sk_timing"],
+                enc["eff_type"], enc["eff_rate"], enc["eff_count"], enc["eff_turns"], tun, rand_buf, max_turns)
+        counts = np.bincount(winner, minlength=3)
+        wins["A"] += int(counts[0])
+        wins["B"] += int(counts[1])
+        wins["draw"] += int(counts[2])
+        a_losses[start:start + m] = a_loss
+        b_losses[start:start + m] = b_loss
+        fired_total += fired.sum(0)
+
+    trig: Counter[str] = Counter()
+    for i, names in enumerate(enc["names"]):
+        for s, name in enumerate(names):
+            if fired_total[i, s]:
+                trig[name] += int(fired_total[i, s])
+    return summarize_results(n, wins, a_losses, b_losses, trig)
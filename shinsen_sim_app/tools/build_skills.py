@@ -5,6 +5,11 @@ from pathlib import Path
 DATA_DIR = Path(__file__).resolve().parent.parent / "data"
 SKILLS_PATH = DATA_DIR / "skills.json"
 
+# 戦法名行（例：火攻（...）
+_HEADER_RE = re.compile(r"^[一-龠ぁ-んァ-ンA-Za-z0-9].*?（")
+# 発動率（例：発動率20%）と効果倍率（例：兵刃ダメージ200%）を1回の走査で拾う
+_PARAM_RE = re.compile(r"発動率\s*(?P<proc>[0-9]+)%|(?P<dmg_type>[兵刃計略]+)ダメージ\s*(?P<rate>[0-9]+)%")
+
 
 def parse_skills(raw_text: str):
     skills = []
@@ -29,7 +34,7 @@ def parse_skills(raw_text: str):
             continue
 
         # 戦法名行の検出（例：火攻）
-        if re.match(r"^[一-龠ぁ-んァ-ンA-Za-z0-9].*?（", line):
+        if _HEADER_RE.match(line):
             push_current()
             skill_name = line.split("（")[0].strip()
             current = {
@@ -42,20 +47,23 @@ def parse_skills(raw_text: str):
             }
             continue
 
-        # 発動率の抽出（例：発動率20%）
-        m = re.search(r"発動率\s*([0-9]+)%", line)
-        if m and current:
-            current["proc"] = int(m.group(1)) / 100.0
-
-        # 効果倍率の抽出（例：兵刃ダメージ200%）
-        m2 = re.search(r"([兵刃計略]+)ダメージ\s*([0-9]+)%", line)
-        if m2 and current:
-            dmg_type = m2.group(1)
-            rate = int(m2.group(2)) / 100.0
-            current["effects"].append({
-                "type": "physical" if dmg_type == "兵刃" else "strategy",
-                "rate": rate
-            })
+        # 発動率・効果倍率の抽出（1行につきそれぞれ最初の1件）
+        got_proc = got_dmg = False
+        for m in _PARAM_RE.finditer(line):
+            if not current:
+                break
+            if m.group("proc") is not None:
+                if not got_proc:
+                    current["proc"] = int(m.group("proc")) / 100.0
+                    got_proc = True
+            elif not got_dmg:
+                dmg_type = m.group("dmg_type")
+                rate = int(m.group("rate")) / 100.0
+                current["effects"].append({
+                    "type": "physical" if dmg_type == "兵刃" else "strategy",
+                    "rate": rate
+                })
+                got_dmg = True
 
         buffer.append(line)
 
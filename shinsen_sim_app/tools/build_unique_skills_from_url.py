@@ -1,42 +1,28 @@
-import json
+import asyncio
+import logging
+import os
 import re
+import sys
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List, Optional
 
-import requests
-from bs4 import BeautifulSoup
+from page_text import extract_name_from_html, fetch_all, fetch_page, html_to_text, load_json, save_json, text_around
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 DATA_DIR = BASE_DIR / "data"
 UNITS_PATH = DATA_DIR / "units.json"
 SKILLS_PATH = DATA_DIR / "skills.json"
 
+# この件数ごとに途中保存する（途中で止めても、そこまでの分は残る）
+CHECKPOINT_EVERY = 10
 
-def load_json(path: Path, default):
-    if path.exists():
-        return json.loads(path.read_text(encoding="utf-8"))
-    return default
+# 発動率 XX% / 兵刃・計略ダメージ XX% を1回の走査で拾う
+_PARAMS_RE = re.compile(r"発動率\s*(?P<proc>[0-9]+)%|(?P<dtype>兵刃|計略)ダメージ\s*(?P<rate>[0-9]+)%")
+# 「固有戦法」の行から5行以内で、空行・適性/対象/発動率の行を除いた最初の行
+_UNIQ_NAME_RE = re.compile(r"固有戦法[^\n]*\n(?:[^\n]*\n){0,4}?[^\S\n]*(?![^\n]*(?:適性|対象|発動率))(\S[^\n]*)")
 
-
-def save_json(path: Path, obj):
-    path.write_text(json.dumps(obj, ensure_ascii=False, indent=2), encoding="utf-8")
-
-
-def extract_name_from_html(html: str) -> str:
-    """
-    ページタイトルなどから「◯◯の評価と戦法」の ◯◯ 部分を抜く
-    ある程度ゆるくマッチさせる
-    """
-    # title タグ優先
-    m = re.search(r"信長の野望[^】]*】\s*([^の]+)の評価と戦法", html)
-    if m:
-        return m.group(1).strip()
-
-    m2 = re.search(r"〖信長の野望 真戦〗([^の]+)の評価と戦法", html)
-    if m2:
-        return m2.group(1).strip()
-
-    return "不明武将"
+# URL ごとの経過は stderr へ（LOGLEVEL=WARNING で失敗だけ、DEBUG で細かい内訳も出す）
+log = logging.getLogger(__name__)
 
 
 def extract_unique_skill_block(text: str) -> str:
@@ -55,22 +41,19 @@ def parse_unique_skill_name(text: str) -> str:
     """
     「固有戦法」の次あたりの行から戦法名を推定
     """
-    lines = [l.strip() for l in text.splitlines()]
-    name = ""
-    for i, line in enumerate(lines):
-        if "固有戦法" in line:
-            # 次の非空行を戦法名候補にする
-            for j in range(i + 1, min(i + 6, len(lines))):
-                cand = lines[j].strip()
-                if not cand:
-                    continue
-                # それっぽくない行をざっくりスキップ
-                if "適性" in cand or "対象" in cand or "発動率" in cand:
-                    continue
-                name = cand
-                break
-            break
-    return name
+    # 見るのは最初の「固有戦法」の行だけ
+    idx = text.find("固有戦法")
+    if idx == -1:
+        return ""
+    m = _UNIQ_NAME_RE.match(text, idx)
+    return m.group(1).strip() if m else ""
+
+
+def _has_params(block: str) -> bool:
+    """
+    block 内に発動率とダメージ倍率の両方が書かれているか
+    """
+    return {"proc", "rate"} <= {m.lastgroup for m in _PARAMS_RE.finditer(block)}
 
 
 def parse_unique_skill_params(block: str) -> Dict[str, Any]:
@@ -78,24 +61,23 @@ def parse_unique_skill_params(block: str) -> Dict[str, Any]:
     固有戦法ブロックから発動率やダメージ倍率を推定
     見つからなければそこそこ妥当なデフォルトを入れる
     """
-    # 余計な空白をまとめる
-    t = re.sub(r"\s+", " ", block)
-
-    # 発動率 XX%
-    m_proc = re.search(r"発動率\s*([0-9]+)%", t)
-    if m_proc:
-        proc = int(m_proc.group(1)) / 100.0
-    else:
-        proc = 0.30  # デフォルト 30%
-
-    # ダメージ倍率
+    proc = None
     dmg_type = None
     rate = None
 
-    m_dmg = re.search(r"(兵刃|計略)ダメージ\s*([0-9]+)%", t)
-    if m_dmg:
-        dmg_type = "physical" if m_dmg.group(1) == "兵刃" else "strategy"
-        rate = int(m_dmg.group(2)) / 100.0
+    # 発動率・ダメージ倍率とも、最初に出てきたものを使う
+    for m in _PARAMS_RE.finditer(block):
+        if m.group("proc"):
+            if proc is None:
+                proc = int(m.group("proc")) / 100.0
+        elif dmg_type is None:
+            dmg_type = "physical" if m.group("dtype") == "兵刃" else "strategy"
+            rate = int(m.group("rate")) / 100.0
+        if proc is not None and dmg_type:
+            break
+
+    if proc is None:
+        proc = 0.30  # デフォルト 30%
 
     effects: List[Dict[str, Any]] = []
     if dmg_type and rate:
@@ -110,28 +92,52 @@ def parse_unique_skill_params(block: str) -> Dict[str, Any]:
     }
 
 
-def fetch_page(url: str) -> BeautifulSoup:
-    res = requests.get(url)
-    res.raise_for_status()
-    return BeautifulSoup(res.text, "html.parser")
+def make_unq_allocator(id_to_skill: Dict[str, Dict[str, Any]]) -> Callable[[], str]:
+    """
+    UNQ001, UNQ002, ... の連番IDを払い出す関数を返す
+    既存の UNQ 番号の最大の次から数え、使用中のIDは飛ばす
+    """
+    used = [int(sid[3:]) for sid in id_to_skill if sid.startswith("UNQ") and sid[3:].isdigit()]
+    next_unq = max(used, default=0) + 1
+
+    def allocate_unq() -> str:
+        nonlocal next_unq
+        cand = f"UNQ{next_unq:03}"
+        while cand in id_to_skill:
+            next_unq += 1
+            cand = f"UNQ{next_unq:03}"
+        next_unq += 1
+        return cand
+
+    return allocate_unq
 
 
 def ensure_unique_skill(
     unit_name: str,
     skills: List[Dict[str, Any]],
     units_map: Dict[str, Dict[str, Any]],
+    name_to_skill: Dict[str, Dict[str, Any]],
+    id_to_skill: Dict[str, Dict[str, Any]],
+    allocate_unq: Callable[[], str],
     url: str,
+    html: Optional[str] = None,
 ):
     """
     1URL(=1武将ページ) から固有戦法を取得し:
       - skills.json にスキルを追加/更新
       - units.json の該当武将の unique_skill_id をそのIDに設定
+    name_to_skill / id_to_skill / allocate_unq は main() で1回だけ作り、ここで追加分を反映していく
+    html を渡した場合は取得済みのページとして使う（渡さなければここで取得）
     """
-    print(f"\n=== 取得中: {url} ===")
+    log.info("=== 取得中: %s ===", url)
 
-    soup = fetch_page(url)
-    html = str(soup)
-    text = soup.get_text("\n", strip=True)
+    if html is None:
+        html = fetch_page(url)
+    # 固有戦法の周辺だけテキスト化する
+    # 戦法名・発動率・ダメージ倍率のどれかが取れなければページ全体で探し直す
+    block = extract_unique_skill_block(text_around(html, "固有戦法"))
+    if not (parse_unique_skill_name(block) and _has_params(block)):
+        block = extract_unique_skill_block(html_to_text(html))
 
     # まず武将名をページから確認（unit_name が空ならここから使う）
     page_name = extract_name_from_html(html)
@@ -139,27 +145,23 @@ def ensure_unique_skill(
         unit_name = page_name
 
     if unit_name not in units_map:
-        print(f"  [!] units.json に '{unit_name}' が見つかりません。スキップします。")
+        log.warning("  [!] units.json に '%s' が見つかりません。スキップします。", unit_name)
         return
 
     unit_obj = units_map[unit_name]
 
-    block = extract_unique_skill_block(text)
     skill_name = parse_unique_skill_name(block)
     params = parse_unique_skill_params(block)
 
     if not skill_name:
-        print(f"  [!] 固有戦法名が取得できませんでした。武将: {unit_name}")
+        log.warning("  [!] 固有戦法名が取得できませんでした。武将: %s", unit_name)
         return
 
     # すでに同名スキルが skills.json にあるか？
-    skills_map_by_name = {s.get("name"): s for s in skills if s.get("name")}
-    skills_map_by_id = {s.get("skill_id"): s for s in skills if s.get("skill_id")}
-
-    if skill_name in skills_map_by_name:
-        skill_id = skills_map_by_name[skill_name]["skill_id"]
-        skill_obj = skills_map_by_name[skill_name]
-        print(f"  既存のスキルを更新: {skill_name} (id={skill_id})")
+    if skill_name in name_to_skill:
+        skill_id = name_to_skill[skill_name]["skill_id"]
+        skill_obj = name_to_skill[skill_name]
+        log.info("  既存のスキルを更新: %s (id=%s)", skill_name, skill_id)
     else:
         # ユニットがすでに何か unique_skill_id を持っていればそれを尊重
         current_id = unit_obj.get("unique_skill_id") or ""
@@ -167,16 +169,8 @@ def ensure_unique_skill(
             skill_id = current_id
         else:
             # 新しいIDを振る (UNQ001, UNQ002, ...)
-            existing_ids = [s.get("skill_id", "") for s in skills]
-            base = "UNQ"
-            n = 1
-            while True:
-                cand = f"{base}{n:03}"
-                if cand not in existing_ids:
-                    skill_id = cand
-                    break
-                n += 1
-        print(f"  新規スキルを追加: {skill_name} (id={skill_id})")
+            skill_id = allocate_unq()
+        log.info("  新規スキルを追加: %s (id=%s)", skill_name, skill_id)
         skill_obj = {
             "skill_id": skill_id,
             "name": skill_name,
@@ -188,31 +182,34 @@ def ensure_unique_skill(
     skill_obj["proc"] = params["proc"]
     skill_obj["effects"] = params["effects"]
 
-    # skills 配列に反映（存在していれば置き換え、なければ追加）
-    replaced = False
-    for i, s in enumerate(skills):
-        if s.get("skill_id") == skill_obj["skill_id"]:
-            skills[i] = skill_obj
-            replaced = True
-            break
-    if not replaced:
+    # skills 配列に反映（同じIDがあれば中身を置き換え、なければ追加）
+    old = id_to_skill.get(skill_id)
+    if old is None:
         skills.append(skill_obj)
+    elif old is not skill_obj:
+        if name_to_skill.get(old.get("name")) is old:
+            del name_to_skill[old["name"]]
+        old.clear()
+        old.update(skill_obj)
+        skill_obj = old
+    name_to_skill[skill_name] = skill_obj
+    id_to_skill[skill_id] = skill_obj
 
     # unit 側の unique_skill_id を更新
     unit_obj["unique_skill_id"] = skill_obj["skill_id"]
     units_map[unit_name] = unit_obj
 
-    print(f"  武将名: {unit_name}")
-    print(f"  固有戦法名: {skill_name}")
-    print(f"  発動率: {params['proc']*100:.1f}%")
     if params["effects"]:
         e0 = params["effects"][0]
-        print(f"  ダメージ: 種類={e0['type']} 倍率={e0['rate']}")
+        log.info("  武将名: %s / 固有戦法名: %s / 発動率: %.1f%% / ダメージ: 種類=%s 倍率=%s",
+                 unit_name, skill_name, params["proc"] * 100, e0["type"], e0["rate"])
     else:
-        print("  ダメージ効果は自動検出できませんでした（バフ系か、解析漏れの可能性）。")
+        log.info("  武将名: %s / 固有戦法名: %s / 発動率: %.1f%%", unit_name, skill_name, params["proc"] * 100)
+        log.info("  ダメージ効果は自動検出できませんでした（バフ系か、解析漏れの可能性）。")
 
 
 def main():
+    logging.basicConfig(level=os.environ.get("LOGLEVEL", "INFO").upper(), format="%(message)s")
     print("===== 真戦: Game8 武将ページURL → 固有戦法を skills.json に自動登録ツール =====")
     print("◆ 使い方")
     print(" 1) すでに build_units_from_url.py で星5武将などを units.json に登録している前提です。")
@@ -225,31 +222,35 @@ def main():
     units = load_json(UNITS_PATH, [])
     skills = load_json(SKILLS_PATH, [])
 
-    units_map = {u.get("name"): u for u in units if u.get("name")}
-    urls: List[str] = []
-
-    try:
-        while True:
-            line = input().strip()
-            if not line:
-                continue
-            urls.append(line)
-    except EOFError:
-        pass
+    # 読み込み時に unit_id 順にしておき、保存時は並べ直さない（武将の追加はしないので順序は崩れない）
+    units_map = {n: u for u in sorted(units, key=lambda u: u.get("unit_id", "")) if (n := u.get("name"))}
+    # 戦法の名前/ID 引きは URL ごとに作り直さず、ここで1回だけ作る
+    name_to_skill = {n: s for s in skills if (n := s.get("name"))}
+    id_to_skill = {sid: s for s in skills if (sid := s.get("skill_id"))}
+    allocate_unq = make_unq_allocator(id_to_skill)
+    # 標準入力はまとめて読む（cat urls.txt | python ... でも使える）
+    urls = [u for line in sys.stdin.read().splitlines() if (u := line.strip())]
 
     if not urls:
         print("URL が1つも入力されませんでした。終了します。")
         return
 
-    for url in urls:
+    # 取得だけ先にまとめて並行で行い、skills / units の更新は1件ずつ順番に
+    pages = asyncio.run(fetch_all(urls))
+    for i, (url, page) in enumerate(zip(urls, pages), 1):
         try:
+            if isinstance(page, BaseException):
+                raise page
             # unit_name はここでは空で渡して、ページ側から推定する
-            ensure_unique_skill("", skills, units_map, url)
+            ensure_unique_skill("", skills, units_map, name_to_skill, id_to_skill, allocate_unq, url, page)
         except Exception as e:
-            print(f"[ERROR] {url} の処理中にエラーが発生しました: {e}")
+            log.error("[ERROR] %s の処理中にエラーが発生しました: %s", url, e)
+        if i % CHECKPOINT_EVERY == 0:
+            save_json(UNITS_PATH, list(units_map.values()))
+            save_json(SKILLS_PATH, skills)
 
     # 反映結果を保存
-    units_new = sorted(units_map.values(), key=lambda u: u.get("unit_id", ""))
+    units_new = list(units_map.values())
     save_json(UNITS_PATH, units_new)
     save_json(SKILLS_PATH, skills)
 
@@ -1,10 +1,13 @@
-import json
+import asyncio
+import bisect
+import logging
+import os
 import re
+import sys
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 
-import requests
-from bs4 import BeautifulSoup
+from page_text import extract_name_from_html, fetch_all, fetch_page, html_to_text, load_json, save_json, text_around
 
 # パス設定
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -12,36 +15,23 @@ DATA_DIR = BASE_DIR / "data"
 UNITS_PATH = DATA_DIR / "units.json"
 SKILLS_PATH = DATA_DIR / "skills.json"
 
+# この件数ごとに途中保存する（途中で止めても、そこまでの分は残る）
+CHECKPOINT_EVERY = 10
 
-def load_json(path: Path, default):
-    if path.exists():
-        return json.loads(path.read_text(encoding="utf-8"))
-    return default
+# 武勇/知略/統率/速度 の順に並ぶ Lv50 値（間の改行・空白は \D がそのまま読み飛ばす）
+# re.ASCII で \d を半角数字だけにしておく
+_STATS_RE = re.compile(r"武勇\D*?(\d+)\D*?知略\D*?(\d+)\D*?統率\D*?(\d+)\D*?速度\D*?(\d+)", re.ASCII)
+_SLUG_RE = re.compile(r"[^\w]+")
+# 「固有戦法」の行から7行以内で、空行・適性兵種/対象種別/発動確率の行を除いた最初の行
+_UNIQ_NAME_RE = re.compile(r"固有戦法[^\n]*\n(?:[^\n]*\n){0,6}?[^\S\n]*(?![^\n]*(?:適性兵種|対象種別|発動確率))(\S[^\n]*)")
 
-
-def save_json(path: Path, obj):
-    path.write_text(json.dumps(obj, ensure_ascii=False, indent=2), encoding="utf-8")
+# URL ごとの経過は stderr へ（LOGLEVEL=WARNING で失敗だけ、DEBUG で細かい内訳も出す）
+log = logging.getLogger(__name__)
 
 
 def slug(text: str) -> str:
     """ID用に、安全な文字だけ残す（全部ASCIIにするのは難しいので、とりあえず記号だけ除去）"""
-    return re.sub(r"[^\w]+", "_", text).strip("_")
-
-
-def extract_name_from_html(html: str) -> str:
-    """
-    ページタイトルから「◯◯の評価と戦法」の ◯◯ を抜く
-    例: 〖信長の野望 真戦〗織田信長の評価と戦法
-    """
-    # titleタグから取る
-    m = re.search(r"信長の野望[^】]*】\s*([^の]+)の評価と戦法", html)
-    if m:
-        return m.group(1).strip()
-    # ダメなら見出しテキストから
-    m2 = re.search(r"〖信長の野望 真戦〗([^の]+)の評価と戦法", html)
-    if m2:
-        return m2.group(1).strip()
-    return "不明武将"
+    return _SLUG_RE.sub("_", text).strip("_")
 
 
 def extract_stats_from_text(text: str) -> Dict[str, int]:
@@ -49,13 +39,7 @@ def extract_stats_from_text(text: str) -> Dict[str, int]:
     ページ全体のテキストから 武勇/知略/統率/速度 のLv50値を抜く
     Game8 の表: 「武勇 ... 161 知略 ... 175 統率 ... 231 速度 ... 110」
     """
-    # 改行・余計な空白をまとめる
-    t = re.sub(r"\s+", " ", text)
-
-    m = re.search(
-        r"武勇[^0-9]*([0-9]+)[^0-9]*知略[^0-9]*([0-9]+)[^0-9]*統率[^0-9]*([0-9]+)[^0-9]*速度[^0-9]*([0-9]+)",
-        t
-    )
+    m = _STATS_RE.search(text)
     if not m:
         return {}
 
@@ -71,19 +55,9 @@ def extract_unique_skill_name(text: str) -> str:
     """
     「固有戦法」の直後の行から戦法名を抜く（かなりざっくり）
     """
-    lines = [l.strip() for l in text.splitlines()]
-    for i, line in enumerate(lines):
-        if "固有戦法" in line:
-            # 次の非空行を探す
-            for j in range(i + 1, min(i + 8, len(lines))):
-                cand = lines[j].strip()
-                if not cand:
-                    continue
-                # 「適性兵種」などの行はスキップ
-                if "適性兵種" in cand or "対象種別" in cand or "発動確率" in cand:
-                    continue
-                return cand
-    return ""
+    # 最初の「固有戦法」で見つからなければ、次の「固有戦法」の行から探し直す
+    m = _UNIQ_NAME_RE.search(text)
+    return m.group(1).strip() if m else ""
 
 
 def build_unique_skill_id(unique_name: str, skills: List[Dict[str, Any]]) -> str:
@@ -108,7 +82,7 @@ def build_unique_skill_id(unique_name: str, skills: List[Dict[str, Any]]) -> str
     return f"UNQ_{slug(unique_name)}"
 
 
-def fetch_unit_from_url(url: str, skills: List[Dict[str, Any]]) -> Dict[str, Any]:
+def fetch_unit_from_url(url: str, skills: List[Dict[str, Any]], html: Optional[str] = None) -> Dict[str, Any]:
     """
     Game8 の武将ページURLから:
       - unit_id（= 名前そのもの）
@@ -116,23 +90,25 @@ def fetch_unit_from_url(url: str, skills: List[Dict[str, Any]]) -> Dict[str, Any
       - base_stats: 武勇/知略/統率/速度 (Lv50)
       - max_soldiers: とりあえず10000に固定（必要ならあとで手動調整）
       - unique_skill_id: 固有戦法名から skills.json を引いてIDに変換
-    を作る
+    を作る（html を渡した場合は取得済みのページとして使う）
     """
-    print(f"\n=== 取得中: {url} ===")
-    res = requests.get(url)
-    res.raise_for_status()
-    html = res.text
-
-    soup = BeautifulSoup(html, "html.parser")
-    text = soup.get_text("\n", strip=True)
+    log.info("=== 取得中: %s ===", url)
+    if html is None:
+        html = fetch_page(url)
+
+    # ステータス表・固有戦法の周辺だけテキスト化する（取れなければページ全体で探し直す）
+    stats = extract_stats_from_text(text_around(html, "武勇"))
+    unique_name = extract_unique_skill_name(text_around(html, "固有戦法"))
+    if not stats or not unique_name:
+        text = html_to_text(html)
+        stats = stats or extract_stats_from_text(text)
+        unique_name = unique_name or extract_unique_skill_name(text)
 
     name = extract_name_from_html(html)
-    stats = extract_stats_from_text(text)
-    unique_name = extract_unique_skill_name(text)
     unique_skill_id = build_unique_skill_id(unique_name, skills)
 
     if not stats:
-        print("  [!] ステータス(武勇/知略/統率/速度)が取れませんでした。あとで手動で入れてください。")
+        log.warning("  [!] ステータス(武勇/知略/統率/速度)が取れませんでした。あとで手動で入れてください。")
 
     unit_id = name  # 日本語IDでOK。必要なら手で U_NOBU などに変えても良い
 
@@ -144,16 +120,15 @@ def fetch_unit_from_url(url: str, skills: List[Dict[str, Any]]) -> Dict[str, Any
         "max_soldiers": 10000,  # とりあえず固定。必要ならJSONを直接編集して調整。
     }
 
-    print(f"  名称: {name}")
-    if stats:
-        print(f"  武勇:{stats['str']} 知略:{stats['int']} 統率:{stats['lea']} 速度:{stats['spd']}")
-    print(f"  固有戦法名: {unique_name or '不明'}")
-    print(f"  固有戦法ID: {unique_skill_id or '(未割り当て)'}")
-    print("  unit_id:", unit_id)
+    s = stats or {"str": "-", "int": "-", "lea": "-", "spd": "-"}
+    log.info("  名称: %s / 武勇:%s 知略:%s 統率:%s 速度:%s / 固有戦法: %s (%s)",
+             name, s["str"], s["int"], s["lea"], s["spd"], unique_name or "不明", unique_skill_id or "未割り当て")
+    log.debug("  unit_id: %s", unit_id)
     return unit_obj
 
 
 def main():
+    logging.basicConfig(level=os.environ.get("LOGLEVEL", "INFO").upper(), format="%(message)s")
     print("===== 真戦: Game8 武将ページURL → units.json 自動生成ツール =====")
     print("信長の野望 真戦の Game8『◯◯の評価と戦法』ページの URL を1行ずつ入力してください。")
     print("例:")
@@ -164,28 +139,31 @@ def main():
 
     skills = load_json(SKILLS_PATH, [])
     units_existing = load_json(UNITS_PATH, [])
-    unit_map = {u["unit_id"]: u for u in units_existing if u.get("unit_id")}
-
-    urls = []
-    try:
-        while True:
-            line = input().strip()
-            if not line:
-                continue
-            urls.append(line)
-    except EOFError:
-        pass
+    # unit_id 順に並べて持ち、新しい ID だけ挿入位置に入れる（保存時に並べ直さない）
+    unit_map = dict(sorted(((uid, u) for u in units_existing if (uid := u.get("unit_id"))), key=lambda kv: kv[0]))
+    sorted_ids = list(unit_map)
+
+    # 標準入力はまとめて読む（cat urls.txt | python ... でも使える）
+    urls = [u for line in sys.stdin.read().splitlines() if (u := line.strip())]
 
+    # 取得だけ先にまとめて並行で行い、units の更新は1件ずつ順番に
+    pages = asyncio.run(fetch_all(urls))
     added = 0
-    for url in urls:
+    for i, (url, page) in enumerate(zip(urls, pages), 1):
         try:
-            unit_obj = fetch_unit_from_url(url, skills)
+            if isinstance(page, BaseException):
+                raise page
+            unit_obj = fetch_unit_from_url(url, skills, page)
+            if unit_obj["unit_id"] not in unit_map:
+                bisect.insort(sorted_ids, unit_obj["unit_id"])
             unit_map[unit_obj["unit_id"]] = unit_obj
             added += 1
         except Exception as e:
-            print(f"  [ERROR] {url} の処理中にエラー: {e}")
+            log.error("  [ERROR] %s の処理中にエラー: %s", url, e)
+        if i % CHECKPOINT_EVERY == 0:
+            save_json(UNITS_PATH, [unit_map[uid] for uid in sorted_ids])
 
-    units_new = sorted(unit_map.values(), key=lambda u: u["unit_id"])
+    units_new = [unit_map[uid] for uid in sorted_ids]
     save_json(UNITS_PATH, units_new)
 
     print("--------------------------------------------------")
@@ -0,0 +1,74 @@
+"""
+build_units_from_url.py / build_unique_skills_from_url.py の抽出処理を、手作りのページで確認する
+（ネットワークには出ない。python tools/check_url_tools.py で実行、NG があれば終了コード 1）
+"""
+import sys
+
+import build_unique_skills_from_url as uniq
+import build_units_from_url as units
+
+HEAD = '<!DOCTYPE html><html><head><meta charset="utf-8"><title>【信長の野望 真戦】天下人の評価と戦法｜ゲームエイト</title></head>\n'
+STATS = ('<table><tr><th>武勇</th><td>150</td></tr><tr><th>知略</th><td>80</td></tr>\n'
+         '<tr><th>統率</th><td>200</td></tr><tr><th>速度</th><td>120</td></tr></table>\n')
+SKILL = '<h3>固有戦法</h3>\n<table><tr><th>天下布武</th></tr><tr><td>適性兵種：騎馬</td></tr>\n'
+PARAMS = '<tr><td>発動率 35%</td></tr><tr><td>敵軍単体に兵刃ダメージ 180%</td></tr></table>\n'
+TAIL = '<footer>© Game8</footer></body></html>'
+
+PAGES = {
+    # 本文より前に、属性・script の中に keyword がある
+    "keyword_in_attr": (HEAD + '<body><nav><a href="#u" title="固有戦法の効果">戦法</a>'
+                        '<a href="#s" title="武勇の上げ方">能力</a></nav>\n'
+                        '<script>var k = "固有戦法";</script>\n' + STATS + SKILL + PARAMS + TAIL),
+    # 発動率・ダメージが keyword からマークアップで 4000 文字以上離れている
+    "params_far": (HEAD + '<body>' + STATS + SKILL + '<tr><td>'
+                   + '<div class="ad-slot"><span class="ad-inner"></span></div>\n' * 200
+                   + '</td></tr>' + PARAMS + TAIL),
+    # 本文より前に、コメントアウトされた固有戦法・武勇の見出しがある
+    "keyword_in_comment": (HEAD + '<body><!-- <div>固有戦法</div><div>武勇</div> -->\n'
+                           + STATS + SKILL + PARAMS + TAIL),
+}
+
+EXPECTED_STATS = {"str": 150, "int": 80, "lea": 200, "spd": 120}
+
+
+def check_units(html: str) -> list:
+    unit = units.fetch_unit_from_url("local", [], html)
+    ng = []
+    if unit["base_stats"] != EXPECTED_STATS:
+        ng.append(f"base_stats={unit['base_stats']}")
+    if unit["unique_skill_id"] != "UNQ_天下布武":
+        ng.append(f"unique_skill_id={unit['unique_skill_id']}")
+    return ng
+
+
+def check_unique(html: str) -> list:
+    skills = []
+    units_map = {"天下人": {"unit_id": "天下人", "name": "天下人", "unique_skill_id": ""}}
+    id_to_skill = {}
+    uniq.ensure_unique_skill("", skills, units_map, {}, id_to_skill,
+                             uniq.make_unq_allocator(id_to_skill), "local", html)
+    if len(skills) != 1:
+        return [f"skills={skills}"]
+    s = skills[0]
+    ng = []
+    if s["name"] != "天下布武":
+        ng.append(f"name={s['name']}")
+    if s["proc"] != 0.35:
+        ng.append(f"proc={s['proc']}")
+    if s["effects"] != [{"type": "physical", "rate": 1.8}]:
+        ng.append(f"effects={s['effects']}")
+    return ng
+
+
+def main():
+    failed = 0
+    for name, html in PAGES.items():
+        for tool, check in (("units", check_units), ("unique", check_unique)):
+            ng = check(html)
+            print(f"{'OK' if not ng else 'NG'}  {name} / {tool}" + ("" if not ng else "  " + ", ".join(ng)))
+            failed += bool(ng)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
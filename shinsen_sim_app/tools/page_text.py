@@ -0,0 +1,199 @@
+"""
+build_units_from_url.py / build_unique_skills_from_url.py で共通に使う部品
+（JSON の読み書き・ページ取得・HTML のテキスト化・武将名の抽出）
+"""
+import asyncio
+import importlib.util
+import json
+import os
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, List, Optional
+
+import httpx
+from lxml import etree
+
+try:
+    import orjson
+except ImportError:     # 無ければ標準の json で読み書きする
+    orjson = None
+
+# HTTP/2 は h2 が入っているときだけ使う（無いと httpx が例外を出す）
+_HTTP2 = importlib.util.find_spec("h2") is not None
+
+# ページタイトル（例：【信長の野望 真戦】織田信長の評価と戦法）
+_TITLE_RE = re.compile(r"信長の野望[^】]*】\s*([^の]+)の評価と戦法")
+_TITLE2_RE = re.compile(r"〖信長の野望 真戦〗([^の]+)の評価と戦法")
+# テキストを拾わない要素
+_SKIP_TAGS = {"head", "script", "style"}
+
+
+@lru_cache(maxsize=8)
+def _read_cached(path_str: str, mtime_ns: int) -> bytes:
+    """ファイルの中身（mtime が変わるまで同じプロセス内では読み直さない）"""
+    return Path(path_str).read_bytes()
+
+
+def _read_bytes(path: Path) -> Optional[bytes]:
+    try:
+        mtime_ns = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    return _read_cached(str(path), mtime_ns)
+
+
+def load_json(path: Path, default):
+    raw = _read_bytes(path)
+    if raw is not None:
+        return orjson.loads(raw) if orjson else json.loads(raw.decode("utf-8"))
+    return default
+
+
+def save_json(path: Path, obj):
+    """
+    中身が変わったときだけ書く。一時ファイルに書いてから差し替えるので、途中で止めても壊れない
+    """
+    if orjson:
+        data = orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE)
+    else:
+        data = (json.dumps(obj, ensure_ascii=False, indent=2) + "\n").encode("utf-8")
+    # 比べる相手はキャッシュではなくディスク上の今の中身（mtime の刻みが粗いと古い中身が返るため）
+    try:
+        if path.read_bytes() == data:
+            return
+    except FileNotFoundError:
+        pass
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def extract_name_from_html(html: str) -> str:
+    """
+    ページタイトルなどから「◯◯の評価と戦法」の ◯◯ 部分を抜く
+    ある程度ゆるくマッチさせる
+    """
+    # title タグ優先（<title> の中だけを見て、取れなければページ全体で探し直す）
+    s = html.find("<title")
+    e = html.find("</title>", s)
+    for t in ((html[s:e], html) if s != -1 and e != -1 else (html,)):
+        m = _TITLE_RE.search(t)
+        if m:
+            return m.group(1).strip()
+
+        m2 = _TITLE2_RE.search(t)
+        if m2:
+            return m2.group(1).strip()
+
+    return "不明武将"
+
+
+class _TextTarget:
+    """
+    lxml パーサーのターゲット。木は作らず、タグの切れ目ごとのテキストを1行ずつ集める
+    （head / script / style の中身は捨てる）
+    """
+
+    def __init__(self):
+        self.lines: List[str] = []
+        self.buf: List[str] = []
+        self.skip = 0
+
+    def _flush(self):
+        if self.buf:
+            s = "".join(self.buf).strip()
+            self.buf = []
+            if s and not self.skip:
+                self.lines.append(s)
+
+    def start(self, tag, attrib):
+        self._flush()
+        if tag in _SKIP_TAGS:
+            self.skip += 1
+
+    def end(self, tag):
+        self._flush()
+        if tag in _SKIP_TAGS and self.skip:
+            self.skip -= 1
+
+    def data(self, data):
+        self.buf.append(data)
+
+    def close(self) -> str:
+        self._flush()
+        return "\n".join(self.lines)
+
+
+def html_to_text(html: str) -> str:
+    """
+    HTML（断片でもよい）のテキストだけを1ノード1行で返す（空行は除く）
+    """
+    if not html.strip():
+        return ""
+    parser = etree.HTMLParser(target=_TextTarget())
+    parser.feed(html)
+    return parser.close()
+
+
+def _find_in_text(html: str, keyword: str, start: int = 0) -> int:
+    """
+    keyword がタグ・属性・コメント・script/style の外（＝本文テキスト）に最初に出る位置を返す（無ければ -1）
+    """
+    idx = html.find(keyword, start)
+    while idx != -1:
+        in_tag = html.rfind("<", 0, idx) > html.rfind(">", 0, idx)
+        in_comment = html.rfind("<!--", 0, idx) > html.rfind("-->", 0, idx)
+        in_code = any(html.rfind("<" + t, 0, idx) > html.rfind("</" + t, 0, idx) for t in ("script", "style"))
+        if not (in_tag or in_comment or in_code):
+            return idx
+        idx = html.find(keyword, idx + len(keyword))
+    return -1
+
+
+def text_around(html: str, keyword: str, min_len: int = 800) -> str:
+    """
+    body の本文で keyword が最初に出る位置からテキスト化する（見つからなければ ""）
+    テキストが min_len 文字以上になるまで HTML の切り出しを広げる（ページ末尾まで行けばそこまで）
+    ページ全体をパースせずに済ませるための近道
+    """
+    idx = _find_in_text(html, keyword, max(html.find("<body"), 0))
+    if idx == -1:
+        return ""
+    size = 4000
+    while True:
+        fragment = html[idx: idx + size]
+        if idx + size >= len(html):
+            return html_to_text(fragment)
+        cut = fragment.rfind("<")
+        if cut > fragment.rfind(">"):     # 末尾で途切れたタグは捨てる
+            fragment = fragment[:cut]
+        text = html_to_text(fragment)
+        if len(text) >= min_len:
+            return text
+        size *= 2
+
+
+def fetch_page(url: str) -> str:
+    """
+    生の HTML を返す（パースは必要な部分だけ呼び出し側で行う）
+    """
+    with httpx.Client(timeout=15, follow_redirects=True) as client:
+        res = client.get(url)
+    res.raise_for_status()
+    return res.text
+
+
+async def fetch_all(urls: List[str]) -> List[Any]:
+    """
+    URL をまとめて並行取得する
+    戻り値は URL と同じ並びで、成功なら HTML 文字列・失敗ならその例外
+    """
+    async with httpx.AsyncClient(http2=_HTTP2, timeout=15, follow_redirects=True,
+                                 limits=httpx.Limits(max_connections=8)) as client:
+        async def get(url: str) -> str:
+            res = await client.get(url)
+            res.raise_for_status()
+            return res.text
+
+        return await asyncio.gather(*(get(u) for u in urls), return_exceptions=True)